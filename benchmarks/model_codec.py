@@ -0,0 +1,52 @@
+"""Compares the legacy JSON account model format with the binary model codec.
+
+Run from the repository root:
+
+    python -m benchmarks.model_codec --days 365 --repeat 20
+"""
+import argparse
+import json
+import os
+import timeit
+from datetime import date, timedelta
+
+os.environ.setdefault("ACCOUNTS_DB_URL", "sqlite://")
+
+from accounts.runtime import Account  # noqa: E402
+
+from webapp.codecs import MsgpackZstdCodec  # noqa: E402
+from webapp.fixtures import create_valued_loan  # noqa: E402
+
+
+def run(days: int, repeat: int) -> dict:
+    account = create_valued_loan(date(2013, 3, 8) + timedelta(days=days))
+    codec = MsgpackZstdCodec()
+
+    json_data = account.json()
+    binary_data = codec.encode(account)
+
+    def per_call(stmt) -> float:
+        return min(timeit.repeat(stmt, number=1, repeat=repeat)) * 1000
+
+    return {
+        "transactions": len(account.transactions),
+        "json": {
+            "bytes": len(json_data.encode()),
+            "encode_ms": per_call(account.json),
+            "decode_ms": per_call(lambda: Account.parse_raw(json_data)),
+        },
+        "msgpack_zstd": {
+            "bytes": len(binary_data),
+            "encode_ms": per_call(lambda: codec.encode(account)),
+            "decode_ms": per_call(lambda: codec.decode(binary_data, Account)),
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=365, help="days of transaction history per account")
+    parser.add_argument("--repeat", type=int, default=20, help="timing repetitions, best is reported")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.days, args.repeat), indent=2))
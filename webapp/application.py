@@ -1,25 +1,104 @@
 """Application module."""
+import logging
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Optional
 
 from fastapi import FastAPI
-from webapp import endpoints
-from webapp.containers import Container
 
+logger = logging.getLogger(__name__)
 
-def create_app() -> FastAPI:
-    container = Container()
 
-    db = container.db()
-    db.create_database()
+def create_app(db_url: Optional[str] = None, create_schema: Optional[bool] = None,
+               warm_up: Optional[bool] = None, shard_urls: Optional[List[str]] = None) -> FastAPI:
+    """Builds the application; database work is deferred to the lifespan startup.
+
+    Arguments left as ``None`` are read from ``ACCOUNTS_DB_URL``, ``ACCOUNTS_CREATE_SCHEMA``,
+    ``ACCOUNTS_WARM_UP`` and ``ACCOUNTS_SHARD_URLS``. Serve with
+    ``uvicorn --factory webapp.application:create_app``.
+    """
+    timings: Dict[str, float] = {}
+
+    with _timed(timings, "import"):
+        # the endpoints pull in the accounts runtime, keep them out of module import
+        from webapp import endpoints
+        container = create_container(db_url, shard_urls)
+
+    if create_schema is None:
+        create_schema = _env_flag("ACCOUNTS_CREATE_SCHEMA", True)
+    if warm_up is None:
+        warm_up = _env_flag("ACCOUNTS_WARM_UP", True)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        if create_schema:
+            with _timed(timings, "create_schema"):
+                container.shard_router().create_database()
 
-    app = FastAPI()
+        # refuse to start when the accounts were sharded differently, their ids would route to the wrong shard
+        container.shard_router().check_layout()
+
+        if warm_up:
+            with _timed(timings, "warm_up_account_types"):
+                account_types = container.account_type_service().get_account_types()
+            with _timed(timings, "warm_up_pool"):
+                connections = container.shard_router().prime_pool()
+            logger.info("Warmed up %d account types and %d connections", len(account_types), connections)
+
+        logger.info("Startup phases (ms): %s", ", ".join(f"{name}={ms:.1f}" for name, ms in timings.items()))
+        yield
+
+    app = FastAPI(lifespan=lifespan)
     app.container = container
+    app.state.startup_timings = timings
     app.include_router(endpoints.router)
     return app
 
 
-app = create_app()
+def create_container(db_url: Optional[str] = None, shard_urls: Optional[List[str]] = None):
+    """Creates the dependency container configured from the arguments or the environment."""
+    from webapp.containers import Container
+
+    container = Container()
+    container.config.db_url.from_value(db_url if db_url is not None else os.environ["ACCOUNTS_DB_URL"])
+    container.config.shard_urls.from_value(shard_urls if shard_urls is not None
+                                           else _env_list("ACCOUNTS_SHARD_URLS"))
+    container.config.shard_strategy.from_env("ACCOUNTS_SHARD_STRATEGY", default="hash")
+    container.config.shard_range_bounds.from_value(_env_list("ACCOUNTS_SHARD_RANGE_BOUNDS"))
+    return container
+
+
+@contextmanager
+def _timed(timings: Dict[str, float], phase: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = (time.perf_counter() - start) * 1000
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_list(name: str) -> List[str]:
+    return [item.strip() for item in os.environ.get(name, "").split(",") if item.strip()]
+
+
+def __getattr__(name: str):
+    # keeps "webapp.application:app" working without building the app on import
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8080)
+    uvicorn.run(create_app(), host="0.0.0.0", port=8080)
@@ -0,0 +1,82 @@
+"""Codecs module."""
+from abc import ABC, abstractmethod
+from datetime import date
+from decimal import Decimal
+from enum import Enum
+from typing import Type, TypeVar
+
+import msgpack
+import zstandard
+from pydantic.main import BaseModel
+
+M = TypeVar("M", bound=BaseModel)
+
+_EXT_DECIMAL = 1
+_EXT_DATE = 2
+
+
+class ModelCodec(ABC):
+    """Serializes pydantic models to the bytes stored in a ``LargeBinary`` column.
+
+    The first byte of every encoded value is the codec format version, so the
+    storage format can change without rewriting existing rows up front.
+    """
+
+    version: int
+
+    @abstractmethod
+    def encode(self, model: BaseModel) -> bytes:
+        pass
+
+    @abstractmethod
+    def decode(self, data: bytes, model_type: Type[M]) -> M:
+        pass
+
+    def _check_version(self, data: bytes) -> None:
+        if not data or data[0] != self.version:
+            found = data[0] if data else None
+            raise UnsupportedFormatError(found)
+
+
+class MsgpackZstdCodec(ModelCodec):
+    """msgpack payload compressed with zstd, behind a one byte format version."""
+
+    version: int = 1
+
+    def __init__(self, level: int = 3) -> None:
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def encode(self, model: BaseModel) -> bytes:
+        payload = msgpack.packb(model.dict(), default=_pack_default, use_bin_type=True)
+        return bytes([self.version]) + self._compressor.compress(payload)
+
+    def decode(self, data: bytes, model_type: Type[M]) -> M:
+        self._check_version(data)
+        payload = self._decompressor.decompress(memoryview(data)[1:])
+        return model_type.parse_obj(msgpack.unpackb(payload, ext_hook=_unpack_ext, raw=False,
+                                                    strict_map_key=False))
+
+
+def _pack_default(value):
+    if isinstance(value, Decimal):
+        return msgpack.ExtType(_EXT_DECIMAL, str(value).encode())
+    if isinstance(value, date):
+        return msgpack.ExtType(_EXT_DATE, value.toordinal().to_bytes(4, "big"))
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Cannot encode value of type {type(value).__name__}")
+
+
+def _unpack_ext(code: int, data: bytes):
+    if code == _EXT_DECIMAL:
+        return Decimal(data.decode())
+    if code == _EXT_DATE:
+        return date.fromordinal(int.from_bytes(data, "big"))
+    return msgpack.ExtType(code, data)
+
+
+class UnsupportedFormatError(ValueError):
+
+    def __init__(self, version):
+        super().__init__(f"Unsupported model format version: {version}")
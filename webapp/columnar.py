@@ -0,0 +1,121 @@
+"""Columnar module.
+
+Builds Arrow record batches straight from transactions, transaction traces and accounts and streams them as
+Arrow IPC or Parquet. pyarrow is only imported when a columnar format is requested.
+"""
+import io
+from datetime import date
+from decimal import Context, Decimal
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from accounts.runtime import Transaction, TransactionTrace
+
+from .export import ExportFormat, ExportRecords
+from .models import AccountRecord
+
+BATCH_SIZE = 10000
+
+DECIMAL_SCALE = 18
+DECIMAL_TYPE = pa.decimal128(38, DECIMAL_SCALE)
+POSITIONS_TYPE = pa.map_(pa.string(), DECIMAL_TYPE)
+
+_DECIMAL_QUANTUM = Decimal(1).scaleb(-DECIMAL_SCALE)
+# the default context has 28 digits, too few to quantize amounts of 1e10 and more to 18 decimal places
+_DECIMAL_CONTEXT = Context(prec=DECIMAL_TYPE.precision)
+
+TRANSACTION_SCHEMA = pa.schema([
+    ("account_id", pa.int64()),
+    ("action_date", pa.date32()),
+    ("value_date", pa.date32()),
+    ("transaction_type", pa.string()),
+    ("amount", DECIMAL_TYPE),
+    ("system_generated", pa.bool_()),
+])
+
+TRACE_SCHEMA = TRANSACTION_SCHEMA.append(pa.field("positions", POSITIONS_TYPE))
+
+ACCOUNT_SCHEMA = pa.schema([
+    ("account_id", pa.int64()),
+    ("account_type", pa.string()),
+    ("active", pa.bool_()),
+    ("created_at", pa.timestamp("us")),
+    ("updated_at", pa.timestamp("us")),
+    ("start_date", pa.date32()),
+    ("positions", POSITIONS_TYPE),
+])
+
+
+def trace_chunks(account_id: int, trace_list: Iterable[TransactionTrace], format: ExportFormat) -> Iterator[bytes]:
+    rows = (_transaction_row(account_id, trace.transaction) + (_positions(trace.positions),) for trace in trace_list)
+    return stream(record_batches(rows, TRACE_SCHEMA), TRACE_SCHEMA, format)
+
+
+def export_chunks(records: Iterable[AccountRecord], format: ExportFormat, kind: ExportRecords) -> Iterator[bytes]:
+    if kind == ExportRecords.ACCOUNTS:
+        schema = ACCOUNT_SCHEMA
+        rows = ((record.account_id, record.account_type, record.active, record.created_at, record.updated_at,
+                 record.account.start_date,
+                 _positions({name: position.amount for name, position in record.account.positions.items()}))
+                for record in records)
+    else:
+        schema = TRANSACTION_SCHEMA
+        rows = (_transaction_row(record.account_id, transaction)
+                for record in records for transaction in record.account.transactions)
+
+    return stream(record_batches(rows, schema), schema, format)
+
+
+def record_batches(rows: Iterable[tuple], schema: pa.Schema, batch_size: int = BATCH_SIZE) -> Iterator[pa.RecordBatch]:
+    """Groups row tuples, in schema column order, into record batches of ``batch_size`` rows."""
+    columns: List[list] = [[] for _ in schema]
+    for row in rows:
+        for column, value in zip(columns, row):
+            column.append(value)
+        if len(columns[0]) >= batch_size:
+            yield pa.RecordBatch.from_arrays(columns, schema=schema)
+            columns = [[] for _ in schema]
+    if columns[0]:
+        yield pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def stream(batches: Iterable[pa.RecordBatch], schema: pa.Schema, format: ExportFormat) -> Iterator[bytes]:
+    """Writes the batches as an Arrow IPC stream or a Parquet file, yielding bytes as each batch is written."""
+    sink = io.BytesIO()
+
+    if format == ExportFormat.ARROW:
+        writer = pa.ipc.new_stream(sink, schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+    else:
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+
+    def drain() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    with writer:
+        for batch in batches:
+            if format == ExportFormat.ARROW:
+                writer.write_batch(batch)
+            else:
+                writer.write_batch(batch, row_group_size=batch.num_rows)
+            data = drain()
+            if data:
+                yield data
+    yield drain()
+
+
+def _transaction_row(account_id: int, transaction: Transaction) -> Tuple[int, date, date, str, Decimal, bool]:
+    return (account_id, transaction.action_date, transaction.value_date, transaction.transaction_type,
+            _decimal(transaction.amount), transaction.system_generated)
+
+
+def _positions(positions: Dict[str, Decimal]) -> List[Tuple[str, Decimal]]:
+    return [(name, _decimal(amount)) for name, amount in positions.items()]
+
+
+def _decimal(value) -> Decimal:
+    # decimal128 has a fixed scale, maximum precision amounts are rounded to it
+    return Decimal(value).quantize(_DECIMAL_QUANTUM, context=_DECIMAL_CONTEXT)
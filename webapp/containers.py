@@ -1,22 +1,32 @@
 """Containers module."""
-import os
 
 from dependency_injector import containers, providers
+from webapp.codecs import MsgpackZstdCodec
 from webapp.database import Database
 from webapp.repositories import AccountTypeRepository, AccountRepository
+from webapp.sharding import create_shard_router
 from webapp.services import AccountTypeService, AccountService
 
 
 class Container(containers.DeclarativeContainer):
     wiring_config = containers.WiringConfiguration(modules=[".endpoints"])
 
-    db_url = os.environ['ACCOUNTS_DB_URL']
+    config = providers.Configuration()
 
-    db = providers.Singleton(Database, db_url=db_url)
+    db = providers.Singleton(Database, db_url=config.db_url)
 
-    account_type_repository = providers.Factory(
+    shard_router = providers.Singleton(
+        create_shard_router,
+        primary=db,
+        shard_urls=config.shard_urls,
+        strategy=config.shard_strategy,
+        range_bounds=config.shard_range_bounds,
+    )
+
+    # a singleton, so its account type cache lives as long as the process
+    account_type_repository = providers.Singleton(
         AccountTypeRepository,
-        session_factory=db.provided.session,
+        router=shard_router,
     )
 
     account_type_service = providers.Factory(
@@ -24,9 +34,12 @@ class Container(containers.DeclarativeContainer):
         account_type_repository=account_type_repository,
     )
 
+    model_codec = providers.Singleton(MsgpackZstdCodec)
+
     account_repository = providers.Factory(
         AccountRepository,
-        session_factory=db.provided.session,
+        router=shard_router,
+        codec=model_codec,
     )
 
     account_service = providers.Factory(
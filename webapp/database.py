@@ -5,7 +5,7 @@ from datetime import datetime
 from typing import Callable
 import logging
 
-from sqlalchemy import create_engine, orm, Column, DateTime, Engine
+from sqlalchemy import create_engine, inspect, orm, Column, DateTime, Engine
 from sqlalchemy.orm import Session, DeclarativeBase
 
 logger = logging.getLogger(__name__)
@@ -25,17 +25,30 @@ class Database:
         else:
             self._engine = create_engine(db_url)
 
-        self._session_factory = orm.scoped_session(
-            orm.sessionmaker(
-                autocommit=False,
-                autoflush=False,
-                bind=self._engine,
-            ),
+        self._sessionmaker = orm.sessionmaker(
+            autocommit=False,
+            autoflush=False,
+            bind=self._engine,
         )
+        self._session_factory = orm.scoped_session(self._sessionmaker)
 
     def create_database(self) -> None:
         Base.metadata.create_all(self._engine)
 
+    def has_table(self, name: str) -> bool:
+        return inspect(self._engine).has_table(name)
+
+    def prime_pool(self, connections: int = None) -> int:
+        """Opens pooled connections up front so the first requests do not pay for them."""
+        if connections is None:
+            size = getattr(self._engine.pool, "size", None)
+            connections = size() if callable(size) else 1
+
+        opened = [self._engine.connect() for _ in range(connections)]
+        for connection in opened:
+            connection.close()
+        return len(opened)
+
     @contextmanager
     def session(self) -> Callable[..., AbstractContextManager[Session]]:
         session: Session = self._session_factory()
@@ -47,3 +60,16 @@ class Database:
             raise
         finally:
             session.close()
+
+    @contextmanager
+    def stream_session(self) -> Callable[..., AbstractContextManager[Session]]:
+        """A session that is not shared with the thread, for generators that stay open between ``yield``s."""
+        session: Session = self._sessionmaker()
+        try:
+            yield session
+        except Exception:
+            logger.exception("Session rollback because of exception")
+            session.rollback()
+            raise
+        finally:
+            session.close()
@@ -1,17 +1,18 @@
 """Endpoints module."""
-from datetime import date
-from typing import List, Union
+from datetime import date, datetime
+from typing import List, Literal, Optional, Union
 
 from accounts.metadata import AccountType
 from accounts.runtime import Account, AccountValuation
 from fastapi import APIRouter, Depends, Response, status
 from dependency_injector.wiring import inject, Provide
-from starlette.responses import JSONResponse, Response
+from starlette.responses import JSONResponse, Response, StreamingResponse
 
 from .containers import Container
-from .models import AccountInfo, ForcastResult
+from .export import ExportFormat, ExportRecords, export_chunks, file_name, media_type
+from .models import AccountInfo, ForcastResult, PostingResult, TransactionPosting
 from .services import AccountTypeService, AccountService
-from .repositories import NotFoundError
+from .repositories import AccountVersionConflict, NotFoundError
 import logging
 
 router = APIRouter()
@@ -93,6 +94,20 @@ def get_accounts(
     return account_service.get_accounts()
 
 
+@router.get("/export/accounts")
+@inject
+def export_accounts(
+        format: ExportFormat = ExportFormat.NDJSON,
+        records: ExportRecords = ExportRecords.ACCOUNTS,
+        gzip: bool = False,
+        updated_after: Optional[datetime] = None,
+        account_service: AccountService = Depends(Provide[Container.account_service])):
+    chunks = export_chunks(account_service.iter_accounts(updated_after), format, records, gzip)
+
+    return StreamingResponse(chunks, media_type=media_type(format, gzip),
+                             headers={"Content-Disposition": f'attachment; filename="{file_name(format, records, gzip)}"'})
+
+
 @router.get("/accounts/{account_id}")
 @inject
 def get_account_by_id(
@@ -114,6 +129,8 @@ def delete_account(
         account_service.delete_account(account_id)
     except NotFoundError:
         return Response(status_code=status.HTTP_404_NOT_FOUND)
+    except AccountVersionConflict:
+        return Response(status_code=status.HTTP_409_CONFLICT)
     else:
         return Response(status_code=status.HTTP_204_NO_CONTENT)
 
@@ -123,10 +140,17 @@ def delete_account(
 def value_account(
         account_id: int,
         action_date: date,
+        format: Optional[Literal["arrow", "parquet"]] = None,
         account_service: AccountService = Depends(Provide[Container.account_service])) -> ForcastResult:
     try:
         valuation = account_service.value(account_id, action_date)
 
+        if format is not None:
+            from .columnar import trace_chunks
+            export_format = ExportFormat(format)
+            return StreamingResponse(trace_chunks(account_id, valuation.trace_list, export_format),
+                                     media_type=media_type(export_format))
+
         return ForcastResult(account_id=account_id, account= valuation.account, trace_list=valuation.trace_list)
 
     except Exception as e:
@@ -163,3 +187,22 @@ def update_account(
         account_service.update_account(account_id, active, account)
     except NotFoundError:
         return Response(status_code=status.HTTP_404_NOT_FOUND)
+    except AccountVersionConflict:
+        return Response(status_code=status.HTTP_409_CONFLICT)
+
+
+@router.post("/accounts/{account_id}/transactions")
+@inject
+def post_transactions(
+        account_id: int,
+        posting: TransactionPosting,
+        account_service: AccountService = Depends(Provide[Container.account_service])) -> PostingResult:
+    try:
+        return account_service.post_transactions(account_id, posting)
+    except NotFoundError:
+        return Response(status_code=status.HTTP_404_NOT_FOUND)
+    except AccountVersionConflict:
+        return Response(status_code=status.HTTP_409_CONFLICT)
+    except ValueError as e:
+        logging.error(e)
+        return Response(status_code=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,161 @@
+"""Export module.
+
+Serializes streamed accounts to NDJSON, CSV, Arrow IPC or Parquet chunks, optionally gzip compressed, for the
+``/export/accounts`` endpoint and the command line:
+
+    python -m webapp.export --format csv --records transactions --gzip --output transactions.csv.gz
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import zlib
+from datetime import datetime
+from enum import Enum
+from typing import Iterable, Iterator
+
+from accounts.runtime import Transaction
+from pydantic.json import pydantic_encoder
+
+from .application import create_container
+from .models import AccountRecord
+
+CHUNK_SIZE = 64 * 1024
+
+ACCOUNT_COLUMNS = ["account_id", "account_type", "active", "created_at", "updated_at", "account"]
+TRANSACTION_COLUMNS = ["account_id", "action_date", "value_date", "transaction_type", "amount", "system_generated"]
+
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+    ARROW = "arrow"
+    PARQUET = "parquet"
+
+
+class ExportRecords(str, Enum):
+    ACCOUNTS = "accounts"
+    TRANSACTIONS = "transactions"
+
+
+COLUMNAR_FORMATS = (ExportFormat.ARROW, ExportFormat.PARQUET)
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.ARROW: "application/vnd.apache.arrow.stream",
+    ExportFormat.PARQUET: "application/vnd.apache.parquet",
+}
+
+
+def export_chunks(records: Iterable[AccountRecord], format: ExportFormat, kind: ExportRecords,
+                  gzip: bool = False) -> Iterator[bytes]:
+    if format in COLUMNAR_FORMATS:
+        from . import columnar
+        chunks = columnar.export_chunks(records, format, kind)
+    elif format == ExportFormat.NDJSON:
+        chunks = _buffered(_ndjson_lines(records, kind))
+    else:
+        chunks = _buffered(_csv_lines(records, kind))
+
+    return _gzipped(chunks) if gzip else chunks
+
+
+def media_type(format: ExportFormat, gzip: bool = False) -> str:
+    return "application/gzip" if gzip else MEDIA_TYPES[format]
+
+
+def file_name(format: ExportFormat, kind: ExportRecords, gzip: bool = False) -> str:
+    return f"{kind.value}.{format.value}" + (".gz" if gzip else "")
+
+
+def _ndjson_lines(records: Iterable[AccountRecord], kind: ExportRecords) -> Iterator[str]:
+    for record in records:
+        if kind == ExportRecords.ACCOUNTS:
+            yield record.json() + "\n"
+        else:
+            for transaction in record.account.transactions:
+                yield json.dumps(dict(zip(TRANSACTION_COLUMNS, _transaction_row(record, transaction))),
+                                 default=pydantic_encoder) + "\n"
+
+
+def _csv_lines(records: Iterable[AccountRecord], kind: ExportRecords) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush() -> str:
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    writer.writerow(ACCOUNT_COLUMNS if kind == ExportRecords.ACCOUNTS else TRANSACTION_COLUMNS)
+    yield flush()
+
+    for record in records:
+        if kind == ExportRecords.ACCOUNTS:
+            writer.writerow([record.account_id, record.account_type, record.active, _isoformat(record.created_at),
+                             _isoformat(record.updated_at), record.account.json()])
+        else:
+            writer.writerows(_transaction_row(record, transaction) for transaction in record.account.transactions)
+        yield flush()
+
+
+def _transaction_row(record: AccountRecord, transaction: Transaction) -> list:
+    return [record.account_id, transaction.action_date.isoformat(), transaction.value_date.isoformat(),
+            transaction.transaction_type, transaction.amount, transaction.system_generated]
+
+
+def _isoformat(value) -> str:
+    return value.isoformat() if value is not None else ""
+
+
+def _buffered(lines: Iterable[str]) -> Iterator[bytes]:
+    parts = []
+    size = 0
+    for line in lines:
+        parts.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield "".join(parts).encode()
+            parts = []
+            size = 0
+    if parts:
+        yield "".join(parts).encode()
+
+
+def _gzipped(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Streams all accounts or transactions to a file.")
+    parser.add_argument("--format", type=ExportFormat, choices=list(ExportFormat), default=ExportFormat.NDJSON)
+    parser.add_argument("--records", type=ExportRecords, choices=list(ExportRecords),
+                        default=ExportRecords.ACCOUNTS)
+    parser.add_argument("--gzip", action="store_true", help="gzip compress the output")
+    parser.add_argument("--updated-after", type=datetime.fromisoformat,
+                        help="only export accounts updated after this ISO timestamp")
+    parser.add_argument("--output", help="output file, stdout by default")
+    args = parser.parse_args()
+
+    account_service = create_container().account_service()
+    chunks = export_chunks(account_service.iter_accounts(args.updated_after), args.format, args.records, args.gzip)
+
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
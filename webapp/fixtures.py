@@ -0,0 +1,135 @@
+"""Fixtures module."""
+from datetime import date
+from decimal import Decimal
+
+from accounts.metadata import AccountType, ScheduleType, TransactionOperation, ScheduledTransactionTiming, DataType, \
+    ScheduleEndType, ScheduleFrequency, BusinessDayAdjustment
+from accounts.runtime import Account, AccountValuation
+
+
+def create_loan():
+    account = Account(account_type_name="Loan", start_date=date(2013, 3, 8))
+    account.properties = {
+        "advance": 624000,
+        "payment": 0}
+    account.dates = {
+        "accrual_start": "2013-03-08",
+        "end_date": "2038-03-08"}
+
+    return account
+
+
+def create_valued_loan(to_date: date = date(2014, 3, 8)) -> Account:
+    account_type = create_loan_account_type()
+    account = Account(start_date=date(2013, 3, 8), account_type_name="Loan", account_type=account_type,
+                      properties={"advance": Decimal(624000), "payment": Decimal(0)},
+                      dates={"accrual_start": date(2013, 3, 8), "end_date": date(2038, 3, 8)})
+
+    valuation = AccountValuation(account=account, account_type=account_type, action_date=to_date)
+    valuation.forecast(to_date, {})
+
+    return valuation.account
+
+
+def create_loan_account_type() -> AccountType:
+    loan_given = AccountType(name="Loan", label="Loan")
+
+    conversion_interest_position = loan_given.add_position_type("conversion_interest", "Conversion Interest")
+    early_redemption_fee_position = loan_given.add_position_type("early_redemption_fee", "Early Redemption Fee")
+    interest_accrued_position = loan_given.add_position_type("accrued", "Interest Accrued")
+    interest_capitalized_position = loan_given.add_position_type("interest_capitalized", "Interest Capitalized")
+    principal_position = loan_given.add_position_type("principal", "Principal")
+
+    loan_given.add_date_type(name="accrual_start", label="Accrual Start Date")
+    loan_given.add_date_type(name="end_date", label="End Date")
+
+    accrual_schedule = ScheduleType(name="accrual", label="Accrual Schedule", frequency=ScheduleFrequency.DAILY,
+                                    end_type=ScheduleEndType.NO_END,
+                                    business_day_adjustment=BusinessDayAdjustment.NO_ADJUSTMENT,
+                                    interval_expression="1", start_date_expression="account.start_date")
+
+    interest_schedule = ScheduleType(name="interest", label="Interest Schedule", frequency=ScheduleFrequency.MONTHLY,
+                                     end_type=ScheduleEndType.NO_END,
+                                     business_day_adjustment=BusinessDayAdjustment.NO_ADJUSTMENT,
+                                     interval_expression="1", start_date_expression="account.start_date",
+                                     end_date_expression="account.end_date",
+                                     include_dates_expression="account.end_date")
+
+    redemption_schedule = ScheduleType(name="redemption", label="Redemption Schedule",
+                                       frequency=ScheduleFrequency.MONTHLY,
+                                       end_type=ScheduleEndType.NO_END,
+                                       business_day_adjustment=BusinessDayAdjustment.NO_ADJUSTMENT,
+                                       interval_expression="1",
+                                       start_date_expression="account.start_date + relativedelta(months=+1)",
+                                       end_date_expression="account.end_date",
+                                       include_dates_expression="account.end_date")
+
+    advance_schedule = ScheduleType(name="advance", label="Advance Schedule",
+                                    frequency=ScheduleFrequency.DAILY,
+                                    end_type=ScheduleEndType.END_DATE,
+                                    business_day_adjustment=BusinessDayAdjustment.NO_ADJUSTMENT,
+                                    interval_expression="1",
+                                    start_date_expression="account.start_date",
+                                    end_date_expression="account.start_date")
+
+    loan_given.add_schedule_type(accrual_schedule)
+    loan_given.add_schedule_type(interest_schedule)
+    loan_given.add_schedule_type(redemption_schedule)
+    loan_given.add_schedule_type(advance_schedule)
+
+    interest_accrued = loan_given.add_transaction_type("interestAccrued", "Interest Accrued", True) \
+        .add_position_rule(TransactionOperation.CREDIT, interest_accrued_position)
+
+    interest_capitalized = loan_given.add_transaction_type("interestCapitalized", "Interest Capitalized") \
+        .add_position_rule(TransactionOperation.CREDIT, interest_capitalized_position) \
+        .add_position_rule(TransactionOperation.DEBIT, interest_accrued_position) \
+        .add_position_rule(TransactionOperation.CREDIT, principal_position)
+
+    early_redemption_fee = loan_given.add_transaction_type("earlyRedemptionFee", "Early Redemption Fee") \
+        .add_position_rule(TransactionOperation.CREDIT, early_redemption_fee_position)
+
+    conversion_interest = loan_given.add_transaction_type("conversionInterest", "Conversion Interest") \
+        .add_position_rule(TransactionOperation.CREDIT, conversion_interest_position)
+
+    redemption = loan_given.add_transaction_type("redemption", "Redemption") \
+        .add_position_rule(TransactionOperation.DEBIT, principal_position)
+
+    advance_transaction = loan_given.add_transaction_type("advance", "Advance") \
+        .add_position_rule(TransactionOperation.CREDIT, principal_position)
+
+    additional_advance_transaction = loan_given.add_transaction_type("additionalAdvance", "Additional Advance") \
+        .add_position_rule(TransactionOperation.CREDIT, principal_position)
+
+    interest_payment_transaction = loan_given.add_transaction_type("interestPayment", "Interest Payment") \
+        .add_position_rule(TransactionOperation.DEBIT, interest_accrued_position)
+
+    loan_given.add_scheduled_transaction(accrual_schedule, ScheduledTransactionTiming.END_OF_DAY,
+                                         interest_accrued,
+                                         "account.principal * accountType.interest.get_rate(value_date, "
+                                         "account.principal) / Decimal(365)")
+
+    loan_given.add_scheduled_transaction(interest_schedule, ScheduledTransactionTiming.END_OF_DAY,
+                                         interest_capitalized,
+                                         "account.accrued")
+
+    loan_given.add_scheduled_transaction(advance_schedule, ScheduledTransactionTiming.START_OF_DAY,
+                                         advance_transaction,
+                                         "account.advance")
+
+    loan_given.add_instalment_type(name="payments", label="Payments", timing=ScheduledTransactionTiming.START_OF_DAY,
+                                   transaction_type=redemption.name,
+                                   property_name="payment",
+                                   solve_for_zero_position="principal",
+                                   solve_for_date="end_date",
+                                   schedule_name=redemption_schedule.name)
+
+    loan_given.add_property_type("advance", "Advance Amount", DataType.DECIMAL, True)
+    loan_given.add_property_type("payment", "Payment Amount", DataType.DECIMAL, True)
+
+    interest_rate = loan_given.add_rate_type("interest", "Interest Rate")
+
+    interest_rate.add_tier(date(2000, 1, 1), Decimal(2000000), Decimal(0.0304))
+    interest_rate.add_tier(date(2000, 1, 1), Decimal(10000000), Decimal(0.025))
+    interest_rate.add_tier(date(2000, 1, 1), Decimal(1E30), Decimal(0.02))
+
+    return loan_given
@@ -1,9 +1,11 @@
 """Models module."""
-from typing import List
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional
 
-from accounts.runtime import Account, TransactionTrace
+from accounts.runtime import Account, ExternalTransaction, TransactionTrace
 from pydantic.main import BaseModel
-from sqlalchemy import Column, String, Boolean, Integer, JSON
+from sqlalchemy import Column, String, Boolean, Integer, JSON, LargeBinary
 
 from .database import Base
 
@@ -19,13 +21,50 @@ class AccountData(Base):
     account_id = Column(Integer, primary_key=True, index=True)
     account_type = Column(String, index=True)
     active = Column(Boolean, default=True)
-    model = Column(JSON)
+    # legacy JSON text, only set on rows not yet rewritten in model_data format
+    model = Column(JSON(none_as_null=True), nullable=True)
+    model_data = Column(LargeBinary, nullable=True)
+    # optimistic concurrency, every ORM update checks and increments it
+    version = Column(Integer, nullable=False, default=1)
+
+    __mapper_args__ = {"version_id_col": version}
+
+
+class IdSequenceData(Base):
+    __tablename__ = 'id_sequences'
+    name = Column(String, primary_key=True)
+    first_id = Column(Integer, nullable=False)
+    next_id = Column(Integer, nullable=False)
+    # strategy, shard count and range bounds the ids are routed with, see ShardRouter.layout
+    shard_layout = Column(String, nullable=False)
 
 
 class AccountInfo(BaseModel):
     account_id: int
     active: bool
     account: Account
+    version: Optional[int] = None
+
+
+class TransactionPosting(BaseModel):
+    transactions: List[ExternalTransaction]
+    # when set, the posting is rejected unless the account is still at this version
+    version: Optional[int] = None
+
+
+class PostingResult(BaseModel):
+    account_id: int
+    version: int
+    positions: Dict[str, Decimal]
+
+
+class AccountRecord(BaseModel):
+    account_id: int
+    account_type: str
+    active: bool
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    account: Account
 
 
 class ForcastResult(BaseModel):
@@ -1,92 +1,231 @@
 """Repositories module."""
 
-from contextlib import AbstractContextManager
-from typing import Callable, Iterator, List
+import heapq
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
 
 from accounts.metadata import AccountType
-from accounts.runtime import Account
+from accounts.runtime import Account, Transaction
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from .models import AccountTypeData, AccountData, AccountInfo
+from sqlalchemy.orm.exc import StaleDataError
+from .codecs import ModelCodec, MsgpackZstdCodec
+from .database import Database
+from .models import AccountTypeData, AccountData, AccountInfo, AccountRecord, PostingResult
+from .sharding import ShardRouter
 
 
 class AccountTypeRepository:
-    def __init__(self, session_factory: Callable[..., AbstractContextManager[Session]]) -> None:
-        self.session_factory = session_factory
+    """Account types are replicated to every shard and read from the primary.
+
+    Parsed account types are cached by name. The cache is per process: it is filled by ``get_account_types`` and
+    on first use, and an entry is evicted when this process creates or deletes that account type.
+    """
+
+    def __init__(self, router: ShardRouter) -> None:
+        self.router = router
+        self._cache: Dict[str, AccountType] = {}
+        self._cache_lock = threading.Lock()
 
     def get_account_types(self) -> List[AccountType]:
-        with self.session_factory() as session:
+        with self.router.primary.session() as session:
             accounts = session.query(AccountTypeData).all()
-            return [AccountType.parse_raw(account.model) for account in accounts]
+            account_types = [AccountType.parse_raw(account.model) for account in accounts]
+
+        with self._cache_lock:
+            self._cache = {account_type.name: account_type for account_type in account_types}
+        return account_types
 
     def get_account_type_by_name(self, name: str) -> AccountType:
-        with self.session_factory() as session:
+        account_type = self._cache.get(name)
+        if account_type is not None:
+            return account_type
+
+        with self.router.primary.session() as session:
             account = session.query(AccountTypeData).filter(AccountTypeData.name == name).first()
 
         if not account:
             raise AccountTypeNotFound(name)
-        return AccountType.parse_raw(account.model)
+
+        account_type = AccountType.parse_raw(account.model)
+        with self._cache_lock:
+            self._cache[name] = account_type
+        return account_type
 
     def create_account_type(self, account_type: AccountType) -> None:
-        with self.session_factory() as session:
-            account_type_obj = AccountTypeData(name=account_type.name, model=account_type.json())
-            session.add(account_type_obj)
-            session.commit()
-            session.refresh(account_type_obj)
+        model = account_type.json()
+        try:
+            try:
+                with self.router.primary.session() as session:
+                    session.add(AccountTypeData(name=account_type.name, model=model))
+                    session.commit()
+            except IntegrityError:
+                # an existing account type is not replaced, only a retry of the same request goes on
+                with self.router.primary.session() as session:
+                    existing = session.get(AccountTypeData, account_type.name)
+                    if existing is None or existing.model != model:
+                        raise
+
+            # merge fills in the copies a failed earlier attempt left out
+            for shard in self.router.shards[1:]:
+                with shard.session() as session:
+                    session.merge(AccountTypeData(name=account_type.name, model=model))
+                    session.commit()
+        finally:
+            self._evict(account_type.name)
 
     def delete_account_type(self, name: str) -> None:
-        with self.session_factory() as session:
-            account = session.query(AccountTypeData).filter(AccountTypeData.name == name).first()
-            if not account:
+        # the primary decides whether the account type exists and is deleted last,
+        # so retrying after a failed shard deletes the remaining copies
+        with self.router.primary.session() as session:
+            if not session.query(AccountTypeData).filter(AccountTypeData.name == name).first():
                 raise AccountTypeNotFound(name)
-            session.delete(account)
-            session.commit()
+
+        try:
+            for shard in self.router.shards[1:] + [self.router.primary]:
+                with shard.session() as session:
+                    session.query(AccountTypeData).filter(AccountTypeData.name == name).delete()
+                    session.commit()
+        finally:
+            self._evict(name)
+
+    def _evict(self, name: str) -> None:
+        with self._cache_lock:
+            self._cache.pop(name, None)
 
 
 class AccountRepository:
-    def __init__(self, session_factory: Callable[..., AbstractContextManager[Session]]) -> None:
-        self.session_factory = session_factory
+    def __init__(self, router: ShardRouter, codec: ModelCodec = None) -> None:
+        self.router = router
+        self.codec = codec if codec is not None else MsgpackZstdCodec()
 
     def get_accounts(self) -> List[AccountInfo]:
-        with self.session_factory() as session:
-            accounts = session.query(AccountData).all()
-            return [AccountInfo(account=Account.parse_raw(account.model), account_id=account.account_id,
-                                active=account.active) for account in accounts]
+        shard_accounts = self.router.fan_out(self._get_shard_accounts)
+        return list(heapq.merge(*shard_accounts, key=lambda account_info: account_info.account_id))
+
+    def _get_shard_accounts(self, shard: Database) -> List[AccountInfo]:
+        with shard.session() as session:
+            accounts = session.query(AccountData).order_by(AccountData.account_id).all()
+            return [self._to_account_info(account) for account in accounts]
+
+    def iter_accounts(self, updated_after: datetime = None, batch_size: int = 500) -> Iterator[AccountRecord]:
+        """Streams accounts ordered by id, optionally only those updated after ``updated_after``.
+
+        Rows are fetched ``batch_size`` at a time through server-side cursors, so memory does not grow
+        with the table size.
+        """
+        shard_records = [self._iter_shard_accounts(shard, updated_after, batch_size) for shard in self.router.shards]
+        return heapq.merge(*shard_records, key=lambda record: record.account_id)
+
+    def _iter_shard_accounts(self, shard: Database, updated_after: datetime,
+                             batch_size: int) -> Iterator[AccountRecord]:
+        # the streaming response resumes this generator on pool threads that also serve other requests
+        with shard.stream_session() as session:
+            query = session.query(AccountData).order_by(AccountData.account_id)
+            if updated_after is not None:
+                query = query.filter(AccountData.updated_at > updated_after)
+
+            for account_obj in query.yield_per(batch_size):
+                yield AccountRecord(account_id=account_obj.account_id, account_type=account_obj.account_type,
+                                    active=account_obj.active, created_at=account_obj.created_at,
+                                    updated_at=account_obj.updated_at, account=self._to_account(account_obj))
 
     def get_account_by_id(self, id: int) -> AccountInfo:
-        with self.session_factory() as session:
+        with self.router.shard_for(id).session() as session:
             account = session.query(AccountData).filter(AccountData.account_id == id).first()
 
         if not account:
             raise AccountNotFound(id)
-        return AccountInfo(account=Account.parse_raw(account.model), account_id=account.account_id,
-                           active=account.active)
+        return self._to_account_info(account)
 
     def create_account(self, account: Account) -> AccountInfo:
-        with self.session_factory() as session:
-            account_obj = AccountData(account_type=account.account_type_name, active=False, model=account.json())
+        account_id = self.router.allocate_id()
+        shard = self.router.primary if account_id is None else self.router.shard_for(account_id)
+
+        with shard.session() as session:
+            account_obj = AccountData(account_id=account_id, account_type=account.account_type_name, active=False,
+                                      model_data=self.codec.encode(account))
             session.add(account_obj)
             session.commit()
             session.refresh(account_obj)
 
         return AccountInfo(account=account, account_id=account_obj.account_id,
-                           active=account_obj.active)
+                           active=account_obj.active, version=account_obj.version)
 
     def delete_account(self, id: int) -> None:
-        with self.session_factory() as session:
+        with self.router.shard_for(id).session() as session:
             account = session.query(AccountData).filter(AccountData.account_id == id).first()
             if not account:
                 raise AccountNotFound(id)
             session.delete(account)
-            session.commit()
+            self._commit_versioned(session, id, account.version)
 
     def update_account(self, account_id: int, active: bool, account: Account) -> None:
-        with self.session_factory() as session:
+        with self.router.shard_for(account_id).session() as session:
             account_obj = session.query(AccountData).filter(AccountData.account_id == account_id).first()
             if not account_obj:
                 raise AccountNotFound(account_id)
-            account_obj.model = account.json()
+            # rows still holding legacy JSON are migrated to the binary format here
+            account_obj.model = None
+            account_obj.model_data = self.codec.encode(account)
             account_obj.active = active
+            self._commit_versioned(session, account_id, account_obj.version)
+
+    def post_transactions(self, account_id: int, transactions: List[Transaction], account_type: AccountType,
+                          expected_version: Optional[int] = None) -> PostingResult:
+        with self.router.shard_for(account_id).session() as session:
+            account_obj = session.query(AccountData).filter(AccountData.account_id == account_id).first()
+            if not account_obj:
+                raise AccountNotFound(account_id)
+            if expected_version is not None and account_obj.version != expected_version:
+                raise AccountVersionConflict(account_id, expected_version)
+
+            account = self._to_account(account_obj)
+            transaction_types = [account_type.get_transaction_type(transaction.transaction_type)
+                                 for transaction in transactions]
+            # accounts written by clients may lack positions of their account type
+            missing = {rule.position_type_name for transaction_type in transaction_types
+                       for rule in transaction_type.position_rules} - account.positions.keys()
+            if missing:
+                raise ValueError(f"Account {account_id} has no positions {', '.join(sorted(missing))}")
+
+            for transaction, transaction_type in zip(transactions, transaction_types):
+                account.add_transaction(transaction, transaction_type)
+
+            account_obj.model = None
+            account_obj.model_data = self.codec.encode(account)
+            self._commit_versioned(session, account_id, account_obj.version)
+
+            return PostingResult(account_id=account_id, version=account_obj.version,
+                                 positions={name: position.amount for name, position in account.positions.items()})
+
+    def get_account_type_name(self, account_id: int) -> str:
+        with self.router.shard_for(account_id).session() as session:
+            account_type = session.query(AccountData.account_type) \
+                .filter(AccountData.account_id == account_id) \
+                .scalar()
+
+        if account_type is None:
+            raise AccountNotFound(account_id)
+        return account_type
+
+    def _commit_versioned(self, session: Session, account_id: int, version: int) -> None:
+        try:
             session.commit()
+        except StaleDataError:
+            # another writer updated or deleted the account after it was read
+            session.rollback()
+            raise AccountVersionConflict(account_id, version)
+
+    def _to_account(self, account_obj: AccountData) -> Account:
+        if account_obj.model_data is not None:
+            return self.codec.decode(account_obj.model_data, Account)
+        return Account.parse_raw(account_obj.model)
+
+    def _to_account_info(self, account_obj: AccountData) -> AccountInfo:
+        return AccountInfo(account=self._to_account(account_obj), account_id=account_obj.account_id,
+                           active=account_obj.active, version=account_obj.version)
 
 
 class NotFoundError(Exception):
@@ -105,3 +244,9 @@ class AccountNotFound(NotFoundError):
 
     def __init__(self, id):
         super().__init__(f"{self.entity_name} not found, name: {id}")
+
+
+class AccountVersionConflict(Exception):
+
+    def __init__(self, id, version):
+        super().__init__(f"Account was modified concurrently, id: {id}, version: {version}")
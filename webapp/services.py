@@ -3,9 +3,9 @@ from datetime import datetime, date
 from typing import Iterator, List
 
 from accounts.metadata import AccountType
-from accounts.runtime import Account, AccountValuation
+from accounts.runtime import Account, AccountValuation, Transaction
 
-from .models import AccountInfo
+from .models import AccountInfo, AccountRecord, PostingResult, TransactionPosting
 from .repositories import AccountTypeRepository, AccountRepository
 
 
@@ -39,6 +39,9 @@ class AccountService:
     def get_account_by_id(self, id: int) -> AccountInfo:
         return self._repository.get_account_by_id(id)
 
+    def iter_accounts(self, updated_after: datetime = None) -> Iterator[AccountRecord]:
+        return self._repository.iter_accounts(updated_after)
+
     def create_account(self, account_prototype: Account) -> AccountInfo:
         account_type = self._account_type_repository.get_account_type_by_name(account_prototype.account_type_name)
 
@@ -58,6 +61,22 @@ class AccountService:
     def update_account(self, account_id: int, active: bool, account: Account) -> AccountInfo:
         self._repository.update_account(account_id, active, account)
 
+    def post_transactions(self, account_id: int, posting: TransactionPosting) -> PostingResult:
+        account_type_name = self._repository.get_account_type_name(account_id)
+        account_type = self._account_type_repository.get_account_type_by_name(account_type_name)
+
+        transaction_type_names = {transaction_type.name for transaction_type in account_type.transaction_types}
+        transactions = []
+        for external_transaction in posting.transactions:
+            if external_transaction.transaction_type_name not in transaction_type_names:
+                raise ValueError(f"Unknown transaction type {external_transaction.transaction_type_name} "
+                                 f"for account type {account_type.name}")
+            transactions.append(Transaction(action_date=date.today(), value_date=external_transaction.value_date,
+                                            transaction_type=external_transaction.transaction_type_name,
+                                            amount=external_transaction.amount, system_generated=False))
+
+        return self._repository.post_transactions(account_id, transactions, account_type, posting.version)
+
     def solve(self, account_id: int) -> AccountValuation:
         account_info = self._repository.get_account_by_id(account_id)
         account = account_info.account
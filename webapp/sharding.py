@@ -0,0 +1,204 @@
+"""Sharding module."""
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, TypeVar
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from .database import Database
+from .models import AccountData, IdSequenceData
+
+T = TypeVar("T")
+
+
+class IdAllocator:
+    """Hands out globally unique account ids in blocks reserved from a counter row on one database.
+
+    Each process reserves ``block_size`` ids at a time, so ids stay unique across workers and shards
+    but are only roughly ordered by creation time. The counter row also records the shard layout it was
+    created with; reserving ids under a different layout raises ``ShardLayoutMismatch``.
+    """
+
+    sequence_name = "accounts"
+
+    def __init__(self, database: Database, shards: Sequence[Database], layout: str, block_size: int = 100) -> None:
+        self._database = database
+        self._shards = shards
+        self._layout = layout
+        self._block_size = block_size
+        self._lock = threading.Lock()
+        self._first_id: Optional[int] = None
+        self._next_id = 0
+        self._limit = 0
+
+    def allocate(self) -> int:
+        with self._lock:
+            if self._next_id >= self._limit:
+                self._next_id = self._reserve(self._block_size)
+                self._limit = self._next_id + self._block_size
+            account_id = self._next_id
+            self._next_id += 1
+            return account_id
+
+    def first_id(self) -> int:
+        """The first id handed out by the shared counter; lower ids were created before sharding was enabled."""
+        if self._first_id is None:
+            with self._lock:
+                if self._first_id is None:
+                    self._reserve(0)
+        return self._first_id
+
+    def _reserve(self, count: int) -> int:
+        while True:
+            with self._database.session() as session:
+                sequence = session.query(IdSequenceData) \
+                    .filter(IdSequenceData.name == self.sequence_name) \
+                    .with_for_update() \
+                    .first()
+                if sequence is None:
+                    # first use, continue after any ids created before sharding was enabled
+                    first_id = self._max_account_id() + 1
+                    sequence = IdSequenceData(name=self.sequence_name, first_id=first_id, next_id=first_id,
+                                              shard_layout=self._layout)
+                    session.add(sequence)
+                elif sequence.shard_layout != self._layout:
+                    raise ShardLayoutMismatch(sequence.shard_layout, self._layout)
+
+                first_id = sequence.first_id
+                start = sequence.next_id
+                sequence.next_id = start + count
+                try:
+                    session.commit()
+                except IntegrityError:
+                    # another worker created the counter row first
+                    session.rollback()
+                    continue
+
+                self._first_id = first_id
+                return start
+
+    def _max_account_id(self) -> int:
+        max_ids = []
+        for shard in self._shards:
+            with shard.session() as session:
+                max_ids.append(session.query(func.max(AccountData.account_id)).scalar() or 0)
+        return max(max_ids)
+
+
+class ShardRouter(ABC):
+    """Maps account ids to the database that stores them.
+
+    The first shard is the primary: it is the source for account type reads and holds the id counter.
+    With a single shard ids come from the database and every call goes to that database.
+    """
+
+    strategy: str
+
+    def __init__(self, shards: Sequence[Database], id_block_size: int = 100) -> None:
+        if not shards:
+            raise ValueError("At least one shard is required")
+        self.shards: List[Database] = list(shards)
+        self._allocator = IdAllocator(self.primary, self.shards, self.layout, id_block_size) \
+            if len(self.shards) > 1 else None
+        self._executor = ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix="shard") \
+            if len(self.shards) > 1 else None
+
+    @property
+    def primary(self) -> Database:
+        return self.shards[0]
+
+    @property
+    def layout(self) -> str:
+        """Identifies how ids are mapped to shards; the same id maps to another shard under a different layout."""
+        return f"{self.strategy}:{len(self.shards)}"
+
+    def check_layout(self) -> None:
+        """Raises ``ShardLayoutMismatch`` when the data on the primary was sharded with a different layout."""
+        if self._allocator is not None:
+            self._allocator.first_id()
+            return
+
+        if not self.primary.has_table(IdSequenceData.__tablename__):
+            return
+        with self.primary.session() as session:
+            sequence = session.get(IdSequenceData, IdAllocator.sequence_name)
+            if sequence is not None:
+                # the counter row is only created with more than one shard
+                raise ShardLayoutMismatch(sequence.shard_layout, self.layout)
+
+    def shard_for(self, account_id: int) -> Database:
+        if self._allocator is not None and account_id < self._allocator.first_id():
+            # accounts created before sharding was enabled stay on the primary
+            return self.primary
+        return self.shards[self.shard_index(account_id)]
+
+    @abstractmethod
+    def shard_index(self, account_id: int) -> int:
+        pass
+
+    def allocate_id(self) -> Optional[int]:
+        if self._allocator is None:
+            return None
+        return self._allocator.allocate()
+
+    def fan_out(self, fn: Callable[[Database], T]) -> List[T]:
+        """Calls ``fn`` for every shard in parallel and returns the results in shard order."""
+        if self._executor is None:
+            return [fn(self.primary)]
+        return list(self._executor.map(fn, self.shards))
+
+    def create_database(self) -> None:
+        self.fan_out(Database.create_database)
+
+    def prime_pool(self) -> int:
+        return sum(self.fan_out(Database.prime_pool))
+
+
+class HashShardRouter(ShardRouter):
+
+    strategy = "hash"
+
+    def shard_index(self, account_id: int) -> int:
+        return account_id % len(self.shards)
+
+
+class RangeShardRouter(ShardRouter):
+    """Routes ids below ``bounds[0]`` to the first shard, below ``bounds[1]`` to the second and so on."""
+
+    strategy = "range"
+
+    def __init__(self, shards: Sequence[Database], bounds: Sequence[int], id_block_size: int = 100) -> None:
+        if len(bounds) != len(shards) - 1:
+            raise ValueError(f"Expected {len(shards) - 1} range bounds for {len(shards)} shards, got {len(bounds)}")
+        if list(bounds) != sorted(bounds):
+            raise ValueError("Range bounds must be ascending")
+        self.bounds = list(bounds)
+        super().__init__(shards, id_block_size)
+
+    @property
+    def layout(self) -> str:
+        return super().layout + ":" + ",".join(str(bound) for bound in self.bounds)
+
+    def shard_index(self, account_id: int) -> int:
+        return bisect_right(self.bounds, account_id)
+
+
+def create_shard_router(primary: Database, shard_urls: Optional[Sequence[str]] = None, strategy: str = None,
+                        range_bounds: Optional[Sequence[int]] = None) -> ShardRouter:
+    shards = [primary] + [Database(db_url=url) for url in shard_urls or []]
+
+    if strategy in (None, "hash"):
+        return HashShardRouter(shards)
+    if strategy == "range":
+        return RangeShardRouter(shards, [int(bound) for bound in range_bounds or []])
+    raise ValueError(f"Unknown shard strategy: {strategy}")
+
+
+class ShardLayoutMismatch(Exception):
+
+    def __init__(self, recorded: str, configured: str):
+        super().__init__(f"Accounts were sharded with layout {recorded}, the configured layout is {configured}; "
+                         f"move the accounts before changing the shards")
@@ -1,23 +1,34 @@
 """Tests module."""
+import csv
+import gzip
+import io
 import json
-from datetime import date
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
 from decimal import Decimal
 from unittest import mock
 
 import pytest
-from accounts.metadata import AccountType, ScheduleType, TransactionOperation, ScheduledTransactionTiming, DataType, \
-    ScheduleEndType, ScheduleFrequency, BusinessDayAdjustment
-from accounts.runtime import Account
+from accounts.metadata import AccountType
+from accounts.runtime import Account, ExternalTransaction
 from dependency_injector.wiring import Provide
 from fastapi import FastAPI, Depends
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine, StaticPool
+from sqlalchemy import create_engine, event, StaticPool, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
 
 from . import endpoints
+from .application import create_app, create_container
+from .codecs import MsgpackZstdCodec, UnsupportedFormatError
 from .containers import Container
 from .database import Base, Database
-from .repositories import NotFoundError, AccountTypeRepository, AccountRepository
+from .fixtures import create_loan, create_loan_account_type, create_valued_loan
+from .models import AccountData, TransactionPosting
+from .repositories import NotFoundError, AccountTypeRepository, AccountRepository, AccountVersionConflict
 from .services import AccountService
+from .sharding import HashShardRouter, RangeShardRouter, ShardLayoutMismatch
 
 
 def create_test_app():
@@ -45,6 +56,13 @@ def client():
     yield TestClient(app)
 
 
+@pytest.fixture(autouse=True)
+def restore_test_wiring():
+    yield
+    # every Container() rewires the endpoints module, point it back at the test app after create_app() tests
+    app.container.wire(modules=[endpoints])
+
+
 def test_get_account_type_list(client):
     repository_mock = mock.Mock(spec=AccountTypeRepository)
     repository_mock.get_account_types.return_value = [
@@ -176,16 +194,463 @@ def test_create_account_in_memory(client):
     assert response.status_code == 201
 
 
-def create_loan():
-    account = Account(account_type_name="Loan", start_date=date(2013, 3, 8))
-    account.properties = {
-        "advance": 624000,
-        "payment": 0}
-    account.dates = {
-        "accrual_start": "2013-03-08",
-        "end_date": "2038-03-08"}
+def test_codec_round_trip():
+    codec = MsgpackZstdCodec()
+    account = create_valued_loan()
+
+    data = codec.encode(account)
+
+    assert data[0] == codec.version
+    assert len(data) < len(account.json())
+    assert codec.decode(data, Account) == account
+
+
+def test_codec_rejects_unknown_version():
+    codec = MsgpackZstdCodec()
+
+    with pytest.raises(UnsupportedFormatError):
+        codec.decode(b"\x7f" + codec.encode(create_loan())[1:], Account)
+
+
+def test_legacy_json_account_rewritten_on_update():
+    account = create_valued_loan()
+    repository = app.container.account_repository()
+
+    with repository.router.primary.session() as session:
+        account_obj = AccountData(account_type="Loan", active=False, model=account.json())
+        session.add(account_obj)
+        session.commit()
+        account_id = account_obj.account_id
+
+    assert repository.get_account_by_id(account_id).account == Account.parse_raw(account.json())
+
+    repository.update_account(account_id, True, account)
+
+    with repository.router.primary.session() as session:
+        model_is_null, model_data = session.execute(
+            text("SELECT model IS NULL, model_data FROM accounts WHERE account_id = :account_id"),
+            {"account_id": account_id}).one()
+        assert model_is_null
+        assert model_data[0] == MsgpackZstdCodec.version
+
+    assert repository.get_account_by_id(account_id).account == account
+
+
+def test_create_app_startup_phases(tmp_path):
+    factory_app = create_app(db_url=f"sqlite:///{tmp_path / 'accounts.db'}", create_schema=True, warm_up=True)
+
+    assert "create_schema" not in factory_app.state.startup_timings
+
+    with TestClient(factory_app) as factory_client:
+        assert factory_client.get("/accounts/").json() == []
+
+    assert set(factory_app.state.startup_timings) == {"import", "create_schema", "warm_up_account_types",
+                                                      "warm_up_pool"}
+
+
+def test_warm_up_caches_account_types(tmp_path):
+    db_url = f"sqlite:///{tmp_path / 'accounts.db'}"
+    seed_container = create_container(db_url)
+    seed_container.shard_router().create_database()
+    seed_container.account_type_repository().create_account_type(create_loan_account_type())
+
+    factory_app = create_app(db_url=db_url, create_schema=False, warm_up=True)
+
+    with TestClient(factory_app):
+        repository = factory_app.container.account_type_repository()
+        with mock.patch.object(AccountType, "parse_raw") as parse_raw:
+            assert repository.get_account_type_by_name("Loan").name == "Loan"
+        parse_raw.assert_not_called()
+
+        repository.delete_account_type("Loan")
+        with pytest.raises(NotFoundError):
+            repository.get_account_type_by_name("Loan")
+
+
+def test_create_app_without_startup_work():
+    factory_app = create_app(db_url="sqlite://", create_schema=False, warm_up=False)
+
+    with TestClient(factory_app):
+        pass
+
+    assert set(factory_app.state.startup_timings) == {"import"}
+
+
+def create_sqlite_shards(tmp_path, count: int):
+    shards = [Database(db_url=f"sqlite:///{tmp_path / f'shard{index}.db'}") for index in range(count)]
+    for shard in shards:
+        shard.create_database()
+    return shards
+
+
+def count_shard_accounts(shard: Database) -> int:
+    with shard.session() as session:
+        return session.query(AccountData).count()
+
+
+def test_sharded_accounts_are_spread_and_merged_in_order(tmp_path):
+    router = HashShardRouter(create_sqlite_shards(tmp_path, 3), id_block_size=4)
+    repository = AccountRepository(router=router)
+
+    created = [repository.create_account(create_loan()).account_id for _ in range(9)]
+
+    assert len(set(created)) == 9
+    assert [count_shard_accounts(shard) for shard in router.shards] == [3, 3, 3]
+    assert [account_info.account_id for account_info in repository.get_accounts()] == sorted(created)
+
+    for account_id in created:
+        assert repository.get_account_by_id(account_id).account_id == account_id
+
+    repository.delete_account(created[0])
+    with pytest.raises(NotFoundError):
+        repository.get_account_by_id(created[0])
+
+
+def test_sharded_ids_continue_after_existing_accounts(tmp_path):
+    shards = create_sqlite_shards(tmp_path, 2)
+    existing = AccountRepository(router=HashShardRouter(shards[:1])).create_account(create_loan())
+
+    repository = AccountRepository(router=RangeShardRouter(shards, [100]))
+    created = repository.create_account(create_loan())
+
+    assert created.account_id > existing.account_id
+    assert [count_shard_accounts(shard) for shard in shards] == [2, 0]
+
+
+def test_accounts_created_before_sharding_stay_on_primary(tmp_path):
+    shards = create_sqlite_shards(tmp_path, 2)
+    existing = [AccountRepository(router=HashShardRouter(shards[:1])).create_account(create_loan()).account_id
+                for _ in range(3)]
+
+    repository = AccountRepository(router=HashShardRouter(shards, id_block_size=4))
+    created = [repository.create_account(create_loan()).account_id for _ in range(4)]
+
+    for account_id in existing + created:
+        assert repository.get_account_by_id(account_id).account_id == account_id
+    assert [count_shard_accounts(shard) for shard in shards] == [5, 2]
+
+    repository.update_account(existing[0], True, create_loan())
+    repository.delete_account(existing[2])
+    assert [account_info.account_id for account_info in repository.get_accounts()] == existing[:2] + created
+
+
+def test_changed_shard_layout_is_refused(tmp_path):
+    shards = create_sqlite_shards(tmp_path, 3)
+    repository = AccountRepository(router=HashShardRouter(shards[:2]))
+    account_ids = [repository.create_account(create_loan()).account_id for _ in range(6)]
+
+    HashShardRouter(shards[:2]).check_layout()
+
+    for router in (HashShardRouter(shards), HashShardRouter(shards[:1]), RangeShardRouter(shards[:2], [3])):
+        with pytest.raises(ShardLayoutMismatch):
+            router.check_layout()
+
+    with pytest.raises(ShardLayoutMismatch):
+        AccountRepository(router=HashShardRouter(shards)).get_account_by_id(account_ids[-1])
+
+
+def test_account_types_replicated_to_every_shard(tmp_path):
+    router = HashShardRouter(create_sqlite_shards(tmp_path, 2))
+    repository = AccountTypeRepository(router=router)
+
+    repository.create_account_type(create_loan_account_type())
+
+    for shard in router.shards:
+        assert AccountTypeRepository(router=HashShardRouter([shard])).get_account_type_by_name("Loan").name == "Loan"
+
+    repository.delete_account_type("Loan")
+
+    for shard in router.shards:
+        with pytest.raises(NotFoundError):
+            AccountTypeRepository(router=HashShardRouter([shard])).get_account_type_by_name("Loan")
+
+
+@pytest.fixture
+def file_app(tmp_path):
+    """An application on a SQLite file shared by the test and its requests, with its account repository."""
+    application = create_app(db_url=f"sqlite:///{tmp_path / 'accounts.db'}", create_schema=True, warm_up=False)
+    yield application, application.container.account_repository()
+
+
+def test_export_accounts_ndjson(file_app):
+    application, repository = file_app
+
+    with TestClient(application) as file_client:
+        created = [repository.create_account(create_valued_loan(date(2013, 4, 8))).account_id for _ in range(3)]
+
+        response = file_client.get("/export/accounts")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["account_id"] for row in rows] == created
+    assert len(rows[0]["account"]["transactions"]) == len(create_valued_loan(date(2013, 4, 8)).transactions)
+
+
+def test_export_transactions_csv_gzip(file_app):
+    application, repository = file_app
+    account = create_valued_loan(date(2013, 4, 8))
+
+    with TestClient(application) as file_client:
+        account_id = repository.create_account(account).account_id
+
+        response = file_client.get("/export/accounts", params={"format": "csv", "records": "transactions",
+                                                               "gzip": True})
+
+    assert response.headers["content-type"] == "application/gzip"
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.content).decode())))
+    assert len(rows) == len(account.transactions)
+    assert rows[0]["account_id"] == str(account_id)
+    assert rows[0]["transaction_type"] == account.transactions[0].transaction_type
+
 
-    return account
+def test_export_accounts_updated_after_watermark(file_app):
+    application, repository = file_app
+
+    with TestClient(application) as file_client:
+        first = repository.create_account(create_loan()).account_id
+        repository.create_account(create_loan())
+        watermark = datetime.now()
+        repository.update_account(first, True, create_loan())
+
+        response = file_client.get("/export/accounts", params={"updated_after": watermark.isoformat()})
+
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["account_id"] for row in rows] == [first]
+
+
+def test_iter_accounts_survives_interleaved_repository_calls(tmp_path):
+    repository = AccountRepository(router=HashShardRouter(create_sqlite_shards(tmp_path, 1)))
+    created = [repository.create_account(create_loan()).account_id for _ in range(3)]
+
+    records = repository.iter_accounts(batch_size=1)
+    first = next(records)
+    # same thread, so a scoped session would be shared and closed by this call
+    assert repository.get_account_by_id(created[1]).account_id == created[1]
+
+    assert [first.account_id] + [record.account_id for record in records] == created
+
+
+def test_post_transactions_applies_positions_and_version(file_app):
+    application, repository = file_app
+
+    with TestClient(application) as file_client:
+        application.container.account_type_repository().create_account_type(create_loan_account_type())
+        account_info = repository.create_account(create_valued_loan(date(2013, 4, 8)))
+        principal = account_info.account.positions["principal"].amount
+
+        response = file_client.post(f"/accounts/{account_info.account_id}/transactions", json={
+            "version": account_info.version,
+            "transactions": [{"transaction_type_name": "redemption", "amount": "1000", "value_date": "2013-04-09"},
+                             {"transaction_type_name": "redemption", "amount": "500", "value_date": "2013-04-10"}]})
+
+        stale = file_client.post(f"/accounts/{account_info.account_id}/transactions", json={
+            "version": account_info.version,
+            "transactions": [{"transaction_type_name": "redemption", "amount": "1", "value_date": "2013-04-11"}]})
+
+        unknown_type = file_client.post(f"/accounts/{account_info.account_id}/transactions", json={
+            "transactions": [{"transaction_type_name": "fee", "amount": "1", "value_date": "2013-04-11"}]})
+
+        missing = file_client.post("/accounts/999/transactions", json={"transactions": []})
+
+    assert response.status_code == 200
+    assert response.json()["version"] == account_info.version + 1
+    assert Decimal(str(response.json()["positions"]["principal"])) == principal - 1500
+    assert stale.status_code == 409
+    assert unknown_type.status_code == 400
+    assert missing.status_code == 404
+
+    stored = repository.get_account_by_id(account_info.account_id)
+    assert stored.version == account_info.version + 1
+    assert [transaction.amount for transaction in stored.account.transactions[-2:]] == [1000, 500]
+
+
+def test_post_transactions_missing_position(file_app):
+    application, repository = file_app
+    account = create_valued_loan(date(2013, 4, 8))
+    del account.positions["principal"]
+
+    with TestClient(application) as file_client:
+        application.container.account_type_repository().create_account_type(create_loan_account_type())
+        account_info = repository.create_account(account)
+
+        response = file_client.post(f"/accounts/{account_info.account_id}/transactions", json={
+            "transactions": [{"transaction_type_name": "redemption", "amount": "1000", "value_date": "2013-04-09"}]})
+
+    assert response.status_code == 400
+    assert repository.get_account_by_id(account_info.account_id).version == account_info.version
+
+
+def test_post_transactions_detects_concurrent_update(file_app):
+    application, repository = file_app
+    account_type = create_loan_account_type()
+
+    with TestClient(application):
+        account_info = repository.create_account(create_loan())
+
+        original_to_account = repository._to_account
+
+        def update_while_reading(account_obj):
+            # another writer commits between this writer's read and its write
+            writer = threading.Thread(target=repository.update_account,
+                                      args=(account_info.account_id, True, create_loan()))
+            writer.start()
+            writer.join()
+            return original_to_account(account_obj)
+
+        repository._to_account = update_while_reading
+
+        with pytest.raises(AccountVersionConflict):
+            repository.post_transactions(account_info.account_id, [], account_type)
+
+
+@contextmanager
+def concurrent_update_before_flush(repository: AccountRepository, account_id: int, active: bool):
+    def update_concurrently(session, flush_context, instances):
+        # another writer commits between this writer's read and its write
+        writer = threading.Thread(target=repository.update_account, args=(account_id, active, create_loan()))
+        writer.start()
+        writer.join()
+
+    event.listen(Session, "before_flush", update_concurrently, once=True)
+    try:
+        yield
+    finally:
+        if event.contains(Session, "before_flush", update_concurrently):
+            event.remove(Session, "before_flush", update_concurrently)
+
+
+def test_put_and_delete_account_concurrent_update_conflict(file_app):
+    application, repository = file_app
+
+    with TestClient(application) as file_client:
+        account_id = repository.create_account(create_loan()).account_id
+
+        with concurrent_update_before_flush(repository, account_id, active=True):
+            put = file_client.put(f"/accounts/{account_id}", params={"active": False},
+                                  content=create_loan().json(), headers={"content-type": "application/json"})
+
+        with concurrent_update_before_flush(repository, account_id, active=False):
+            delete = file_client.delete(f"/accounts/{account_id}")
+
+    assert put.status_code == 409
+    assert delete.status_code == 409
+    assert repository.get_account_by_id(account_id).version == 3
+
+
+def test_post_transactions_decodes_account_once(file_app):
+    application, repository = file_app
+
+    with TestClient(application):
+        application.container.account_type_repository().create_account_type(create_loan_account_type())
+        account_id = repository.create_account(create_valued_loan(date(2013, 4, 8))).account_id
+
+        codec = application.container.model_codec()
+        with mock.patch.object(codec, "decode", wraps=codec.decode) as decode:
+            application.container.account_service().post_transactions(account_id, TransactionPosting(
+                transactions=[ExternalTransaction(transaction_type_name="redemption", amount=Decimal(1),
+                                                  value_date=date(2013, 4, 9))]))
+
+    decode.assert_called_once()
+
+
+def test_value_account_arrow_trace(file_app):
+    import pyarrow as pa
+
+    application, _ = file_app
+
+    with TestClient(application) as file_client:
+        application.container.account_type_repository().create_account_type(create_loan_account_type())
+        account_id = file_client.post("/accounts", json={
+            "start_date": "2013-03-08",
+            "account_type_name": "Loan",
+            "properties": {"advance": 12345678901.25, "payment": 0},
+            "dates": {"accrual_start": "2013-03-08", "end_date": "2038-03-08"}}).json()["account_id"]
+
+        response = file_client.get(f"/accounts/{account_id}/value",
+                                   params={"action_date": "2013-04-08", "format": "arrow"})
+        csv_response = file_client.get(f"/accounts/{account_id}/value",
+                                       params={"action_date": "2013-04-08", "format": "csv"})
+        openapi = file_client.get("/openapi.json").json()
+
+    assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.schema.field("value_date").type == pa.date32()
+    assert table.schema.field("amount").type == pa.decimal128(38, 18)
+    assert table.num_rows == len(create_valued_loan(date(2013, 4, 8)).transactions)
+    assert table.column("transaction_type")[0].as_py() == "advance"
+    assert dict(table.column("positions")[0].as_py())["principal"] == Decimal("12345678901.25")
+    assert csv_response.status_code == 422
+    assert csv_response.json()["detail"][0]["loc"] == ["query", "format"]
+    parameters = {parameter["name"]: parameter
+                  for parameter in openapi["paths"]["/accounts/{account_id}/value"]["get"]["parameters"]}
+    assert parameters["format"]["schema"]["enum"] == ["arrow", "parquet"]
+
+
+def test_export_transactions_parquet(file_app):
+    import pyarrow.parquet as pq
+
+    application, repository = file_app
+    account = create_valued_loan(date(2013, 4, 8))
+
+    with TestClient(application) as file_client:
+        account_ids = [repository.create_account(account).account_id for _ in range(2)]
+
+        response = file_client.get("/export/accounts", params={"format": "parquet", "records": "transactions"})
+
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.num_rows == 2 * len(account.transactions)
+    assert sorted(set(table.column("account_id").to_pylist())) == account_ids
+    assert table.column("amount").to_pylist()[0] == account.transactions[0].amount
+
+
+def test_account_type_create_and_delete_retry_repairs_shards(tmp_path):
+    router = HashShardRouter(create_sqlite_shards(tmp_path, 2))
+    repository = AccountTypeRepository(router=router)
+    replica = AccountTypeRepository(router=HashShardRouter(router.shards[1:]))
+
+    # only the primary got the account type before a failure
+    AccountTypeRepository(router=HashShardRouter(router.shards[:1])).create_account_type(create_loan_account_type())
+
+    repository.create_account_type(create_loan_account_type())
+    assert replica.get_account_type_by_name("Loan").name == "Loan"
+
+    # the primary still has the account type after the replica was deleted and the primary failed
+    replica.delete_account_type("Loan")
+
+    repository.delete_account_type("Loan")
+    for shard in router.shards:
+        with pytest.raises(NotFoundError):
+            AccountTypeRepository(router=HashShardRouter([shard])).get_account_type_by_name("Loan")
+
+
+def test_duplicate_account_type_is_not_replaced(tmp_path):
+    router = HashShardRouter(create_sqlite_shards(tmp_path, 2))
+    repository = AccountTypeRepository(router=router)
+    account_type = create_loan_account_type()
+    repository.create_account_type(account_type)
+
+    changed = create_loan_account_type()
+    changed.transaction_types = changed.transaction_types[:1]
+
+    with pytest.raises(IntegrityError):
+        repository.create_account_type(changed)
+
+    for shard in router.shards:
+        stored = AccountTypeRepository(router=HashShardRouter([shard])).get_account_type_by_name("Loan")
+        assert len(stored.transaction_types) == len(account_type.transaction_types) > 1
+
+
+def test_load_test_percentile_nearest_rank():
+    from benchmarks.load_test import percentile
+
+    hundred = [float(value) for value in range(1, 101)]
+    assert percentile(hundred, 50) == 50
+    assert percentile(hundred, 95) == 95
+    assert percentile(hundred, 99) == 99
+    assert percentile([float(value) for value in range(1, 11)], 50) == 5
+    assert percentile([7.0], 99) == 7
+    assert percentile([], 50) is None
 
 
 def test_status(client):
@@ -193,107 +658,3 @@ def test_status(client):
     assert response.status_code == 200
     data = response.json()
     assert data == {"status": "OK"}
-
-
-def create_loan_account_type() -> AccountType:
-    loan_given = AccountType(name="Loan", label="Loan")
-
-    conversion_interest_position = loan_given.add_position_type("conversion_interest", "Conversion Interest")
-    early_redemption_fee_position = loan_given.add_position_type("early_redemption_fee", "Early Redemption Fee")
-    interest_accrued_position = loan_given.add_position_type("accrued", "Interest Accrued")
-    interest_capitalized_position = loan_given.add_position_type("interest_capitalized", "Interest Capitalized")
-    principal_position = loan_given.add_position_type("principal", "Principal")
-
-    loan_given.add_date_type(name="accrual_start", label="Accrual Start Date")
-    loan_given.add_date_type(name="end_date", label="End Date")
-
-    accrual_schedule = ScheduleType(name="accrual", label="Accrual Schedule", frequency=ScheduleFrequency.DAILY,
-                                    end_type=ScheduleEndType.NO_END,
-                                    business_day_adjustment=BusinessDayAdjustment.NO_ADJUSTMENT,
-                                    interval_expression="1", start_date_expression="account.start_date")
-
-    interest_schedule = ScheduleType(name="interest", label="Interest Schedule", frequency=ScheduleFrequency.MONTHLY,
-                                     end_type=ScheduleEndType.NO_END,
-                                     business_day_adjustment=BusinessDayAdjustment.NO_ADJUSTMENT,
-                                     interval_expression="1", start_date_expression="account.start_date",
-                                     end_date_expression="account.end_date",
-                                     include_dates_expression="account.end_date")
-
-    redemption_schedule = ScheduleType(name="redemption", label="Redemption Schedule",
-                                       frequency=ScheduleFrequency.MONTHLY,
-                                       end_type=ScheduleEndType.NO_END,
-                                       business_day_adjustment=BusinessDayAdjustment.NO_ADJUSTMENT,
-                                       interval_expression="1",
-                                       start_date_expression="account.start_date + relativedelta(months=+1)",
-                                       end_date_expression="account.end_date",
-                                       include_dates_expression="account.end_date")
-
-    advance_schedule = ScheduleType(name="advance", label="Advance Schedule",
-                                    frequency=ScheduleFrequency.DAILY,
-                                    end_type=ScheduleEndType.END_DATE,
-                                    business_day_adjustment=BusinessDayAdjustment.NO_ADJUSTMENT,
-                                    interval_expression="1",
-                                    start_date_expression="account.start_date",
-                                    end_date_expression="account.start_date")
-
-    loan_given.add_schedule_type(accrual_schedule)
-    loan_given.add_schedule_type(interest_schedule)
-    loan_given.add_schedule_type(redemption_schedule)
-    loan_given.add_schedule_type(advance_schedule)
-
-    interest_accrued = loan_given.add_transaction_type("interestAccrued", "Interest Accrued", True) \
-        .add_position_rule(TransactionOperation.CREDIT, interest_accrued_position)
-
-    interest_capitalized = loan_given.add_transaction_type("interestCapitalized", "Interest Capitalized") \
-        .add_position_rule(TransactionOperation.CREDIT, interest_capitalized_position) \
-        .add_position_rule(TransactionOperation.DEBIT, interest_accrued_position) \
-        .add_position_rule(TransactionOperation.CREDIT, principal_position)
-
-    early_redemption_fee = loan_given.add_transaction_type("earlyRedemptionFee", "Early Redemption Fee") \
-        .add_position_rule(TransactionOperation.CREDIT, early_redemption_fee_position)
-
-    conversion_interest = loan_given.add_transaction_type("conversionInterest", "Conversion Interest") \
-        .add_position_rule(TransactionOperation.CREDIT, conversion_interest_position)
-
-    redemption = loan_given.add_transaction_type("redemption", "Redemption") \
-        .add_position_rule(TransactionOperation.DEBIT, principal_position)
-
-    advance_transaction = loan_given.add_transaction_type("advance", "Advance") \
-        .add_position_rule(TransactionOperation.CREDIT, principal_position)
-
-    additional_advance_transaction = loan_given.add_transaction_type("additionalAdvance", "Additional Advance") \
-        .add_position_rule(TransactionOperation.CREDIT, principal_position)
-
-    interest_payment_transaction = loan_given.add_transaction_type("interestPayment", "Interest Payment") \
-        .add_position_rule(TransactionOperation.DEBIT, interest_accrued_position)
-
-    loan_given.add_scheduled_transaction(accrual_schedule, ScheduledTransactionTiming.END_OF_DAY,
-                                         interest_accrued,
-                                         "account.principal * accountType.interest.get_rate(value_date, "
-                                         "account.principal) / Decimal(365)")
-
-    loan_given.add_scheduled_transaction(interest_schedule, ScheduledTransactionTiming.END_OF_DAY,
-                                         interest_capitalized,
-                                         "account.accrued")
-
-    loan_given.add_scheduled_transaction(advance_schedule, ScheduledTransactionTiming.START_OF_DAY,
-                                         advance_transaction,
-                                         "account.advance")
-
-    loan_given.add_instalment_type(name="payments", label="Payments", timing=ScheduledTransactionTiming.START_OF_DAY,
-                                   transaction_type=redemption.name,
-                                   property_name="payment",
-                                   solve_for_zero_position="principal",
-                                   solve_for_date="end_date",
-                                   schedule_name=redemption_schedule.name)
-
-    loan_given.add_property_type("advance", "Advance Amount", DataType.DECIMAL, True)
-    loan_given.add_property_type("payment", "Payment Amount", DataType.DECIMAL, True)
-
-    interest_rate = loan_given.add_rate_type("interest", "Interest Rate")
-
-    interest_rate.add_tier(date(2000, 1, 1), Decimal(2000000), Decimal(0.0304))
-    interest_rate.add_tier(date(2000, 1, 1), Decimal(10000000), Decimal(0.025))
-    interest_rate.add_tier(date(2000, 1, 1), Decimal(1E30), Decimal(0.02))
-
-    return loan_given